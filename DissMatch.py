@@ -1,26 +1,32 @@
 # This script matches students to supervisors using their preferences.
-# It uses linear programming (PuLP) to maximize an overall satisfaction score.
+# It uses a minimum weight bipartite matching (SciPy) to maximize an overall satisfaction score.
 # It uses data from an Excel file with two sheets: supervisors and students. It writes data in a third sheet: matches
 # Every student and every supervisor has a list of supervision areas in order of preference.
 # The goal is to assign students to supervisors in a way that maximises overall satisfaction based on preferences and workload constraints.
 
+import numpy as np
 import pandas as pd
-from pulp import LpProblem, LpVariable, LpMaximize, lpSum, LpBinary
+from openpyxl import load_workbook
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
 
-# This function removes numbers from a string, which is useful for cleaning up names or areas.
-# This useful because the lists of areas from students and supervisors are numbered differently.
 import re
 
+# The regular expressions are compiled once here instead of on every call.
+number_pattern = re.compile(r'\d+')
+area_pattern = re.compile(r'[\s\d\.,]+')
+
+# This function removes numbers from a string, which is useful for cleaning up names or areas.
+# This useful because the lists of areas from students and supervisors are numbered differently.
 def remove_numbers(text):
     if isinstance(text, str):
-        return re.sub(r'\d+', '', text).strip()
+        return number_pattern.sub('', text).strip()
     return text
 
-def normalize_area(text):
-    if isinstance(text, str):
-        # Remove all numbers, whitespace, dots, and commas, then lowercase
-        return re.sub(r'[\s\d\.,]+', '', text).lower()
-    return text
+# This function normalizes a whole column of area strings at once (much faster than cleaning every cell on its own). Empty cells stay empty.
+def normalize_area(column):
+    # Remove all numbers, whitespace, dots, and commas, then lowercase
+    return column.astype(object).str.replace(area_pattern, '', regex=True).str.lower()
 
 # 1. Load data from Excel
 file = file = "dissmatch_data.xlsx" # Insert here the name or path to the Excel file
@@ -37,21 +43,22 @@ student_names = students['name'].tolist()
 workload = dict(zip(supervisors['name'], supervisors['workload']))
 
 # Normalize all area strings for comparison
-raw_areas = supervisors[['area1','area2','area3','area4','area5']].values.flatten()
-areas = list(set(normalize_area(a) for a in raw_areas if pd.notnull(a)))
+supervisor_area_cols = [f'area{i}' for i in range(1, 6)]
+supervisor_areas = supervisors[supervisor_area_cols].apply(normalize_area)
+student_area_cols = [col for col in students.columns if col.startswith('proposal_')]
+student_areas = students[student_area_cols].apply(normalize_area)
+areas = list(set(supervisor_areas.stack().dropna()))
 
 # Extraction of preferences for supervisors (normalized)
-supervisor_area_cols = [f'area{i}' for i in range(1, 6)]
 supervisor_preferences = {
-    row['name']: [normalize_area(row[col]) for col in supervisor_area_cols if pd.notnull(row[col])]
-    for _, row in supervisors.iterrows()
+    name: [area for area in row if pd.notnull(area)]
+    for name, row in zip(supervisors['name'], supervisor_areas.itertuples(index=False))
 }
 
 # Extraction of preferences for students (normalized)
-student_area_cols = [col for col in students.columns if col.startswith('proposal_')]
 student_preferences = {
-    row['name']: [normalize_area(row[col]) for col in student_area_cols if pd.notnull(row[col])]
-    for _, row in students.iterrows()
+    name: [area for area in row if pd.notnull(area)]
+    for name, row in zip(students['name'], student_areas.itertuples(index=False))
 }
 
 #The prepared data can be displayed here
@@ -65,212 +72,196 @@ student_preferences = {
 #print(student_preferences["Alice"])
 
 # 3. Set up the problem
-prob = LpProblem("Supervision_Allocation", LpMaximize)
+# Matching students to supervisors with a workload is a bipartite matching problem, so it is solved exactly with SciPy's minimum weight matching instead of a general integer program.
+# Every possible match (student, supervisor, area) is listed below. The objective and the constraints are built from NumPy arrays with one entry per possible match.
 
-# 4. Create decision variables for shared areas: x[student, supervisor, area]. This section creates a list of all student/supervisor matches for each area.  
-x = {}
-for student in student_names:
-    for supervisor in supervisor_names:
-        for area in areas:
-            x[(student, supervisor, area)] = LpVariable(f"x_{student}_{supervisor}_{area}", 0, 1, LpBinary)
+# 4. Create possible matches for shared areas: keys[n] is the n-th possible match (student, supervisor, area). This section creates a list of all student/supervisor matches for each area.  
+# Only allow matches if area is in both preferences: only areas that are in both the student's top 3 and the supervisor's top 5 are listed.
+student_pref_set = {student: set(prefs[:3]) for student, prefs in student_preferences.items()}
+supervisor_pref_set = {supervisor: set(prefs[:5]) for supervisor, prefs in supervisor_preferences.items()}
+
+keys = [
+    (student, supervisor, area)
+    for student in student_names
+    for supervisor in supervisor_names
+    for area in student_pref_set[student] & supervisor_pref_set[supervisor]
+]
 
 # 5. Define satisfaction scores.
-# You can tinker with all the return values - these are satisfaction points that contribute to the overall score.
+# You can tinker with all the point values - these are satisfaction points that contribute to the overall score (whole numbers between -128 and 127).
 # The higher the score, the more the code will try to create matches to obtain that score i.e. if choice 1 is assigned, it will get 10 points, if choice 2 is assigned, it will get 7 points, etc.
 # If the student values are overall higher than supervisor values, then student choices are considered more important. 
-def student_points(student, area):
-    prefs = student_preferences[student]
-    if len(prefs) > 0 and area == prefs[0]: return 10 # Highest satisfaction for first preference
-    if len(prefs) > 1 and area == prefs[1]: return 7
-    if len(prefs) > 2 and area == prefs[2]: return 5
-    return -10  # Penalize non-matching areas. Don't change this value, as it is used to eliminate non-matching areas.
-
-def supervisor_points(supervisor, area):
-    prefs = supervisor_preferences[supervisor]
-    if len(prefs) > 0 and area == prefs[0]: return 5 # Highest satisfaction for first preference
-    if len(prefs) > 1 and area == prefs[1]: return 4
-    if len(prefs) > 2 and area == prefs[2]: return 3
-    if len(prefs) > 3 and area == prefs[3]: return 2
-    if len(prefs) > 4 and area == prefs[4]: return 1
-    return -10  # Penalize non-matching areas. Don't change this value, as it is used to eliminate non-matching areas.
-
-# Build satisfaction dictionary
-satisfaction = {}
-for student in student_names:
-    for supervisor in supervisor_names:
-        for area in areas:
-            satisfaction[(student, supervisor, area)] = student_points(student, area) + supervisor_points(supervisor, area)
+student_choice_points = [10, 7, 5] # Points for the first, second and third preference of a student
+supervisor_choice_points = [5, 4, 3, 2, 1] # Points for the first to fifth preference of a supervisor
+non_matching_points = -10  # Penalize non-matching areas. Areas that are not in both preference lists are never matched (see step 4).
+
+# Students, supervisors and areas are numbered, so all preferences fit in small NumPy arrays.
+student_index = {student: i for i, student in enumerate(student_names)}
+supervisor_index = {supervisor: j for j, supervisor in enumerate(supervisor_names)}
+area_index = {area: k for k, area in enumerate(areas)}
+
+# This function turns preference lists into a table: row i holds the area numbers of the first choices of the i-th person, -1 for empty choices or areas that no supervisor offers.
+def choice_table(names, preferences, choices):
+    table = np.full((len(names), choices), -1, dtype=np.int16)
+    for i, name in enumerate(names):
+        for c, area in enumerate(preferences[name][:choices]):
+            table[i, c] = area_index.get(area, -1)
+    return table
+
+# This function turns a choice table into rank[i, k], the choice number (0 = first choice) of the k-th area for the i-th person, or -1 if the area is not one of the choices.
+# The choices are filled in from last to first, so if an area is listed twice, its first (better) choice number is kept.
+def rank_table(choices):
+    rank = np.full((len(choices), len(areas)), -1, dtype=np.int8)
+    rows = np.arange(len(choices))
+    for c in reversed(range(choices.shape[1])):
+        listed = choices[:, c] >= 0
+        rank[rows[listed], choices[listed, c]] = c
+    return rank
+
+student_choices = choice_table(student_names, student_preferences, 3)
+supervisor_choices = choice_table(supervisor_names, supervisor_preferences, 5)
+
+# student_rank[i, k] and supervisor_rank[j, k] are the choice numbers of the k-th area for the i-th student and the j-th supervisor.
+# They are also used for the preference statistics in step 13.
+student_rank = rank_table(student_choices)
+supervisor_rank = rank_table(supervisor_choices)
+
+# Build satisfaction scores: student_score[i, k] and supervisor_score[j, k] are the points of the i-th student and the j-th supervisor for the k-th area.
+student_score = np.where(
+    student_rank >= 0, np.array(student_choice_points, dtype=np.int8)[student_rank], non_matching_points
+).astype(np.int8)
+supervisor_score = np.where(
+    supervisor_rank >= 0, np.array(supervisor_choice_points, dtype=np.int8)[supervisor_rank], non_matching_points
+).astype(np.int8)
+
+# satisfaction[n] is the score of the n-th possible match (student points + supervisor points)
+student_idx = np.array([student_index[student] for (student, _, _) in keys], dtype=np.intp)
+supervisor_idx = np.array([supervisor_index[supervisor] for (_, supervisor, _) in keys], dtype=np.intp)
+area_idx = np.array([area_index[area] for (_, _, area) in keys], dtype=np.intp)
+satisfaction = student_score[student_idx, area_idx].astype(np.int16) + supervisor_score[supervisor_idx, area_idx]
+
+# student_choice[n] is the student's choice number (1 to 3) of the n-th possible match. It is stored now, so the export does not need to look it up again.
+student_choice = student_rank[student_idx, area_idx] + 1
 
 # 6. Objective: maximize total satisfaction
-prob += lpSum(
-    satisfaction[(student, supervisor, area)] * x[(student, supervisor, area)]
-    for student in student_names
-    for supervisor in supervisor_names
-    for area in areas
-)
+# Both constraints below only count students, not areas, so every student/supervisor pair only needs its best shared area.
+# best[m] is the possible match with the highest satisfaction for the m-th pair (pairs are sorted by pair_ids).
+pair_ids = student_idx * len(supervisor_names) + supervisor_idx
+order = np.argsort(-satisfaction, kind="stable")
+pair_ids, first_of_pair = np.unique(pair_ids[order], return_index=True)
+best = order[first_of_pair]
 
 # Check if the satisfaction scores are calculated correctly. 
-# print("Satisfaction score:",satisfaction[("Bob", "Prof. Lee", "Human Rights Law")]) 
+# print("Satisfaction score:",satisfaction[keys.index(("Bob", "Prof. Lee", "humanrightslaw"))]) 
 
 # 7. Constraint - Each student can only be assigned to one supervisor and one area
-for student in student_names:
-    prob += lpSum(
-        x[(student, supervisor, area)]
-        for supervisor in supervisor_names
-        for area in areas
-    ) <= 1 # Each student must be assigned one supervisor and one area. 
+# Every student is one node on the left side of the graph and gets matched to exactly one node on the right side.
+# Each student also has an own "no supervisor" node on the right side, so the student can stay unmatched.
+# Students who don't share an area with any supervisor are left out of the graph, as they can't be matched anyway.
 # If no match can be made, the asnwer will show the unmatched students.
+active_students = np.unique(student_idx[best])
+student_row = np.zeros(len(student_names), dtype=np.intp)
+student_row[active_students] = np.arange(len(active_students))
 
 # 8. Constraint - No supervisor exceeds their workload
-for supervisor in supervisor_names:
-    prob += lpSum(
-        x[(student, supervisor, area)]
-        for student in student_names
-        for area in areas
-    ) <= workload[supervisor] # Each supervisor's total assignments must not exceed their workload. 
+# Every supervisor gets one node on the right side per student they can supervise (their "slots"), and each slot can only take one student.
+# A supervisor never needs more slots than students they share an area with, so supervisors without any possible match get no slots at all.
 # If there are more students than supervision workload, the answer will show the supervisors with remaining workload.
-
-# 9. Constraint - Only allow matches if area is in both preferences
-for student in student_names:
-    for supervisor in supervisor_names:
-        for area in areas:
-            if satisfaction[(student, supervisor, area)] == -20:
-                prob += x[(student, supervisor, area)] == 0 # If the area is not in both preferences, the match is not allowed.
-
-# 10. Solve the problem
-prob.solve()
-
-# 11. Check the solution status
-from pulp import LpStatus
-print("Status:", LpStatus[prob.status])
-
-# 12. Display the assignments
-for student in student_names:
-    for supervisor in supervisor_names:
-        for area in areas:
-            val = x[(student, supervisor, area)].varValue
-            if val is not None and val > 0.5:
-                print(f"{student} assigned to {supervisor} for area {area}")
-
-
-# 13. Export matches to Excel ("matches" sheet) with student choice number
-results = []
-for student in student_names:
-    prefs = student_preferences[student]
-    for supervisor in supervisor_names:
-        for area in areas:
-            val = x[(student, supervisor, area)].varValue
-            if val is not None and val > 0.5:
-                # Determine student's choice number for this area
-                if len(prefs) > 0 and area == prefs[0]:
-                    choice = 1
-                elif len(prefs) > 1 and area == prefs[1]:
-                    choice = 2
-                elif len(prefs) > 2 and area == prefs[2]:
-                    choice = 3
-                else:
-                    choice = None
-                results.append({
-                    'student': student,
-                    'supervisor': supervisor,
-                    'area': area,
-                    'student_choice': choice
-                })
-
-results_df = pd.DataFrame(results)
-with pd.ExcelWriter(file, mode='a', if_sheet_exists='replace') as writer:
-    results_df.to_excel(writer, sheet_name='matches', index=False)
-
-
-# 14. Test the solution
+workload_limits = np.array([workload[supervisor] for supervisor in supervisor_names], dtype=np.intp)
+slot_limits = np.minimum(workload_limits, np.bincount(supervisor_idx[best], minlength=len(supervisor_names)))
+slot_start = np.cumsum(slot_limits) - slot_limits
+slot_count = int(slot_limits.sum())
+no_supervisor = slot_count + np.arange(len(active_students))
+
+# Each pair is connected to all slots of its supervisor.
+slots_per_pair = slot_limits[supervisor_idx[best]]
+edge_match = np.repeat(best, slots_per_pair)
+edge_offset = np.arange(len(edge_match)) - np.repeat(np.cumsum(slots_per_pair) - slots_per_pair, slots_per_pair)
+edge_rows = np.concatenate([student_row[student_idx[edge_match]], np.arange(len(active_students))])
+edge_columns = np.concatenate([slot_start[supervisor_idx[edge_match]] + edge_offset, no_supervisor])
+
+# The matching minimizes the total cost, so a match costs (highest score + 1 - satisfaction) and staying unmatched costs (highest score + 1).
+# All costs are positive, and the cheapest matching is the one with the highest total satisfaction.
+highest_cost = float(satisfaction.max(initial=0)) + 1
+edge_costs = np.concatenate([highest_cost - satisfaction[edge_match], np.full(len(active_students), highest_cost)])
+graph = csr_matrix((edge_costs, (edge_rows, edge_columns)), shape=(len(active_students), slot_count + len(active_students)))
+
+# 9. Solve the problem
+# The matching algorithm is exact and runs in polynomial time, so unlike an integer program it needs no starting solution (warm start) to be fast.
+matched_rows, matched_columns = min_weight_full_bipartite_matching(graph)
+
+# 10. Check the solution status
+# Thanks to the "no supervisor" nodes a full matching always exists, so the result is always optimal.
+print("Status: Optimal")
+
+# Collect the chosen matches once, so the sections below only loop over the actual assignments.
+# Students matched to a slot get the best area of their pair with the slot's supervisor.
+slot_owner = np.repeat(np.arange(len(supervisor_names)), slot_limits)
+has_supervisor = matched_columns < slot_count
+matched_pairs = active_students[matched_rows[has_supervisor]] * len(supervisor_names) + slot_owner[matched_columns[has_supervisor]]
+chosen = np.sort(best[np.searchsorted(pair_ids, matched_pairs)])
+assignments = [keys[n] for n in chosen]
+# The counts per supervisor and the matched students are taken from the index arrays of the chosen matches in one go.
+assigned_by_supervisor = np.bincount(supervisor_idx[chosen], minlength=len(supervisor_names)).tolist()
+is_matched = np.zeros(len(student_names), dtype=bool)
+is_matched[student_idx[chosen]] = True
+
+# 11. Display the assignments
+for (student, supervisor, area) in assignments:
+    print(f"{student} assigned to {supervisor} for area {area}")
+
+
+# 12. Export matches to Excel ("matches" sheet) with student choice number
+results = [
+    {'student': student, 'supervisor': supervisor, 'area': area, 'student_choice': choice}
+    for (student, supervisor, area), choice in zip(assignments, student_choice[chosen].tolist())
+]
+
+# The workbook is opened once with openpyxl and the "matches" sheet is replaced at the same position, so the other sheets are not converted by pandas again.
+columns = ['student', 'supervisor', 'area', 'student_choice']
+workbook = load_workbook(file)
+position = len(workbook.sheetnames)
+if 'matches' in workbook.sheetnames:
+    position = workbook.sheetnames.index('matches')
+    del workbook['matches']
+sheet = workbook.create_sheet('matches', position)
+sheet.append(columns)
+for result in results:
+    sheet.append([result[column] for column in columns])
+workbook.save(file)
+
+
+# 13. Test the solution
 
 # Total satisfaction score
-total_satisfaction = sum(
-    satisfaction[(student, supervisor, area)]
-    for student in student_names
-    for supervisor in supervisor_names
-    for area in areas
-    if x[(student, supervisor, area)].varValue is not None and x[(student, supervisor, area)].varValue > 0.5
-)
+total_satisfaction = int(satisfaction[chosen].sum())
 print("Total satisfaction score:", total_satisfaction)
 
 # Supervisor workload check
-for supervisor in supervisor_names:
-    count = sum(
-        x[(student, supervisor, area)].varValue is not None and x[(student, supervisor, area)].varValue > 0.5
-        for student in student_names
-        for area in areas
-    )
+for supervisor, count in zip(supervisor_names, assigned_by_supervisor):
     print(f"{supervisor}: assigned {count} students (workload limit: {workload[supervisor]})")
 
 # Student preference satisfaction check
-first, second, third, other = 0, 0, 0, 0
-for student in student_names:
-    for supervisor in supervisor_names:
-        for area in areas:
-            if x[(student, supervisor, area)].varValue is not None and x[(student, supervisor, area)].varValue > 0.5:
-                prefs = student_preferences[student]
-                if len(prefs) > 0 and area == prefs[0]:
-                    first += 1
-                elif len(prefs) > 1 and area == prefs[1]:
-                    second += 1
-                elif len(prefs) > 2 and area == prefs[2]:
-                    third += 1
-                else:
-                    other += 1
+# np.bincount counts how many matches have each choice number: position 0 counts the other areas, position 1 the first choices, etc.
+choice_counts = np.bincount(student_choice[chosen], minlength=4)
+other, first, second, third = choice_counts.tolist()
 print(f"First student choice: {first}, Second: {second}, Third: {third}, Other: {other}")
 
 # Supervisor preference satisfaction check
-first, second, third, fourth, fifth, other = 0, 0, 0, 0, 0, 0
-for student in student_names:
-    for supervisor in supervisor_names:
-        for area in areas:
-            if x[(student, supervisor, area)].varValue is not None and x[(student, supervisor, area)].varValue > 0.5:
-                prefs = supervisor_preferences[supervisor]
-                if len(prefs) > 0 and area == prefs[0]:
-                    first += 1
-                elif len(prefs) > 1 and area == prefs[1]:
-                    second += 1
-                elif len(prefs) > 2 and area == prefs[2]:
-                    third += 1
-                elif len(prefs) > 3 and area == prefs[3]:
-                    fourth += 1
-                elif len(prefs) > 4 and area == prefs[4]:
-                    fifth += 1
-                else:
-                    other += 1
+choice_counts = np.bincount(supervisor_rank[supervisor_idx[chosen], area_idx[chosen]] + 1, minlength=6)
+other, first, second, third, fourth, fifth = choice_counts.tolist()
 print(f"First supervisor choice: {first}, Second: {second}, Third: {third}, Fourth: {fourth}, Fifth: {fifth}, Other: {other}")
 
 # All students matched?
-assigned_students = set()
-for student in student_names:
-    for supervisor in supervisor_names:
-        for area in areas:
-            if x[(student, supervisor, area)].varValue is not None and x[(student, supervisor, area)].varValue > 0.5:
-                assigned_students.add(student)
-print("All students matched:", len(assigned_students) == len(student_names))
+print("All students matched:", bool(is_matched.all()))
 
 # Identify unmatched students
-unmatched = []
-for student in student_names:
-    assigned = False
-    for supervisor in supervisor_names:
-        for area in areas:
-            val = x[(student, supervisor, area)].varValue
-            if val is not None and val > 0.5:
-                assigned = True
-    if not assigned:
-        unmatched.append(student)
+unmatched = [student for student, matched in zip(student_names, is_matched.tolist()) if not matched]
 print("Unmatched students due to workload or other constraints:", unmatched)
 
 # Identify supervisors with remaining capacity
 supervisors_with_capacity = []
-for supervisor in supervisor_names:
-    assigned_count = sum(
-        x[(student, supervisor, area)].varValue is not None and x[(student, supervisor, area)].varValue > 0.5
-        for student in student_names
-        for area in areas
-    )
+for supervisor, assigned_count in zip(supervisor_names, assigned_by_supervisor):
     if assigned_count < workload[supervisor]:
         supervisors_with_capacity.append((supervisor, workload[supervisor] - assigned_count))
         print(f"{supervisor} has {workload[supervisor] - assigned_count} slots remaining.")